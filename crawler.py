@@ -1,10 +1,40 @@
 #!/usr/bin/env python3
 import os
+import logging
+import errno
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import re
+import functools
 import time
+import tempfile
+import shutil
+import socket
+import signal
 import subprocess
+import queue
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# Log level from the LOG environment variable, falling back to INFO for unknown names
+_log_level = getattr(logging, os.environ.get('LOG', 'INFO').upper(), None)
+if not isinstance(_log_level, int):
+    _log_level = logging.INFO
+logging.basicConfig(level=_log_level, format='%(asctime)s %(levelname)s %(message)s')
+log = logging.getLogger('crawler')
+
+# Year patterns used when extracting links
+_YEAR_PREFIX_RE = re.compile(r'^(\d{3})')
+_YEAR_IN_DESC_RE = re.compile(r'(\d{3,4})年')
+
+@functools.lru_cache(maxsize=256)
+def _roc_to_ad(roc):
+    """Convert a ROC (Taiwan) year string to an AD year string"""
+    return str(int(roc) + 1911)
 
 class TaiwanOpenDataCrawler:
     def __init__(self):
@@ -12,20 +42,140 @@ class TaiwanOpenDataCrawler:
         self.api_base = "https://data.gov.tw/api/v2/rest/dataset"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
+        }
+        
+        # Enhanced headers to avoid 406 errors on file downloads
+        self.download_headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'application/vnd.oasis.opendocument.spreadsheet, application/octet-stream, */*',
+            'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+            # ODS files are already ZIP compressed
+            'Accept-Encoding': 'identity',
+            'Connection': 'keep-alive',
+            'Referer': 'https://data.gov.tw/'
         }
         
-    def get_dataset_via_api(self, dataset_id):
-        """Fetch dataset information via API"""
+        # Shared session so repeated calls to data.gov.tw reuse connections
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Retry transient failures with exponential backoff, on the same pooled connections
+        retries = Retry(total=4, backoff_factor=1.0,
+                        status_forcelist=[406, 408, 429, 500, 502, 503, 504],
+                        allowed_methods=['GET', 'HEAD'])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Number of concurrent downloads, kept low to stay polite to the server
+        self.max_workers = 4
+        
+        # On-disk cache for API responses
+        self.api_cache_dir = "cache/api"
+        
+        # Resident LibreOffice listener used by unoconv, started in run()
+        self.soffice_port = 2202
+        self._soffice_proc = None
+        self._soffice_profile = None
+        
+    def _read_json(self, path):
+        """Load a JSON file"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_json(self, path, data):
+        """Write a JSON file atomically via a temp file in the same directory"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    
+    def _move_file(self, src, dst):
+        """Move a file atomically, even when src is on another filesystem"""
+        try:
+            os.replace(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Copy next to dst first so dst only ever appears complete
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst), suffix='.tmp')
+            os.close(fd)
+            try:
+                shutil.copyfile(src, tmp_path)
+                shutil.copymode(src, tmp_path)
+                os.replace(tmp_path, dst)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            os.remove(src)
+    
+    def get_dataset_via_api(self, dataset_id, max_age=24 * 60 * 60):
+        """Fetch dataset information via API, revalidating the on-disk cache"""
         url = f"{self.api_base}/{dataset_id}"
-        print(f"Fetching dataset via API: {url}")
+        cache_path = os.path.join(self.api_cache_dir, f"{dataset_id}.json")
+        meta_path = os.path.join(self.api_cache_dir, f"{dataset_id}.meta.json")
+        
+        # Load cache metadata if we have a cached response
+        meta = {}
+        if os.path.exists(cache_path) and os.path.exists(meta_path):
+            try:
+                meta = self._read_json(meta_path)
+            except Exception as e:
+                log.warning("Ignoring unreadable cache metadata %s: %s", meta_path, e)
+        
+        # Skip the network entirely while the cache is fresh
+        if meta and time.time() - meta.get('fetched_at', 0) < max_age:
+            try:
+                log.info("Using cached dataset: %s", cache_path)
+                return self._read_json(cache_path)
+            except Exception as e:
+                log.warning("Ignoring unreadable cache %s: %s", cache_path, e)
+                meta = {}
+        
+        log.info("Fetching dataset via API: %s", url)
+        
+        # Conditional request headers
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, headers=headers, timeout=30)
+            
+            if response.status_code == 304:
+                log.info("Dataset %s not modified, using cache", dataset_id)
+                meta['fetched_at'] = time.time()
+                try:
+                    self._write_json(meta_path, meta)
+                except OSError as e:
+                    log.warning("Could not update cache metadata %s: %s", meta_path, e)
+                return self._read_json(cache_path)
+            
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            
+            # Update cache, a failure here must not lose the fetched data
+            try:
+                self._write_json(cache_path, data)
+                self._write_json(meta_path, {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': time.time()
+                })
+            except OSError as e:
+                log.warning("Could not write API cache for dataset %s: %s", dataset_id, e)
+            return data
         except Exception as e:
-            print(f"Error fetching dataset {dataset_id}: {e}")
+            log.error("Error fetching dataset %s: %s", dataset_id, e)
             return None
     
     def extract_ods_links_from_api(self, api_data):
@@ -35,136 +185,375 @@ class TaiwanOpenDataCrawler:
         if not api_data or 'result' not in api_data:
             return ods_links
         
-        distributions = api_data['result'].get('distribution', [])
+        try:
+            distributions = api_data['result']['distribution']
+        except KeyError:
+            distributions = []
         
         for dist in distributions:
-            # Get download URL
+            # Get download URL and resource details
             download_url = dist.get('resourceDownloadUrl', '')
+            description = dist.get('resourceDescription', '')
+            records = dist.get('resourceAmount', 'N/A')
+            path = urlsplit(download_url).path
             
             # Only process ODS files
-            if '.ods' in download_url.lower():
-                # Extract year from filename (first 3 digits)
-                filename = os.path.basename(download_url)
-                year_match = re.match(r'^(\d{3})', filename)
-                
+            if os.path.splitext(path)[1].lower() != '.ods':
+                continue
+            
+            # Extract year from filename (first 3 digits)
+            filename = os.path.basename(path)
+            year_match = _YEAR_PREFIX_RE.match(filename)
+            
+            if year_match:
+                year = year_match.group(1)
+                # Convert ROC year to AD year
+                year = _roc_to_ad(year)
+            else:
+                # Try to extract from description as fallback
+                year_match = _YEAR_IN_DESC_RE.search(description)
                 if year_match:
                     year = year_match.group(1)
-                    # Convert ROC year to AD year
-                    year = str(int(year) + 1911)
+                    if len(year) == 3 and year.isdigit():
+                        year = _roc_to_ad(year)
                 else:
-                    # Try to extract from description as fallback
-                    description = dist.get('resourceDescription', '')
-                    year_match = re.search(r'(\d{3,4})年', description)
-                    if year_match:
-                        year = year_match.group(1)
-                        if len(year) == 3 and year.isdigit():
-                            year = str(int(year) + 1911)
-                    else:
-                        year = 'unknown'
-                
-                ods_links.append({
-                    'url': download_url,
-                    'year': year,
-                    'description': dist.get('resourceDescription', ''),
-                    'records': dist.get('resourceAmount', 'N/A')
-                })
+                    year = 'unknown'
+            
+            ods_links.append({
+                'url': download_url,
+                'year': year,
+                'description': description,
+                'records': records
+            })
         
         return ods_links
     
-    def download_ods_file(self, url, output_path):
-        """Download ODS file to specified path"""
+    def is_csv_current(self, url, csv_path, validators):
+        """Check with a HEAD request whether an existing CSV still matches the remote file"""
         try:
-            print(f"Downloading: {url}")
-            
-            # Enhanced headers to avoid 406 errors
-            download_headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'application/vnd.oasis.opendocument.spreadsheet, application/octet-stream, */*',
-                'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Referer': 'https://data.gov.tw/'
-            }
-            
-            response = requests.get(url, headers=download_headers, stream=True, timeout=30)
+            response = self.session.head(url, headers=self.download_headers, allow_redirects=True, timeout=30)
             response.raise_for_status()
-            
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            print(f"Downloaded to: {output_path}")
-            return True
         except Exception as e:
-            print(f"Error downloading file: {e}")
-            # Try alternative download method with session
+            # Keep the existing CSV if the server cannot tell us
+            log.warning("Error checking %s: %s", url, e)
+            return True
+        
+        etag = response.headers.get('ETag')
+        length = response.headers.get('Content-Length')
+        last_modified = response.headers.get('Last-Modified')
+        
+        if etag and validators.get('etag'):
+            return etag == validators['etag']
+        if length and validators.get('length'):
+            return length == validators['length']
+        if last_modified:
             try:
-                session = requests.Session()
-                session.headers.update(download_headers)
-                response = session.get(url, stream=True, timeout=30)
+                return parsedate_to_datetime(last_modified).timestamp() <= os.path.getmtime(csv_path)
+            except (TypeError, ValueError):
+                pass
+        return True
+    
+    def download_ods_file(self, url, output_path, validators=None):
+        """Download ODS file to specified path, whose directory must already exist
+        
+        If validators is a dict, it receives the ETag and Content-Length of the response.
+        """
+        try:
+            log.info("Downloading: %s", url)
+            
+            with self.session.get(url, headers=self.download_headers, stream=True, timeout=30) as response:
                 response.raise_for_status()
                 
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                if validators is not None:
+                    validators['etag'] = response.headers.get('ETag')
+                    validators['length'] = response.headers.get('Content-Length')
                 
-                print(f"Downloaded (using session) to: {output_path}")
-                return True
-            except Exception as e2:
-                print(f"Error with alternative download method: {e2}")
+                # Stream the body to a .part file in 1 MB blocks, then move it into place
+                part_path = output_path + '.part'
+                response.raw.decode_content = True
+                try:
+                    with open(part_path, 'wb') as f:
+                        shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(part_path, output_path)
+                except BaseException:
+                    # Never leave a half-written file behind, even on Ctrl-C
+                    if os.path.exists(part_path):
+                        os.unlink(part_path)
+                    raise
+            
+            log.info("Downloaded to: %s", output_path)
+            return True
+        except Exception as e:
+            log.error("Error downloading file: %s", e)
+            return False
+    
+    def start_soffice(self, timeout=30):
+        """Start a resident LibreOffice listener so conversions skip the cold start"""
+        if not shutil.which('unoconv'):
+            log.warning("unoconv not found, starting LibreOffice per conversion")
+            return False
+        
+        # Private profile so a leftover listener can never collide with later LibreOffice runs
+        self._soffice_profile = tempfile.mkdtemp(prefix='soffice-profile-')
+        cmd = [
+            'soffice',
+            '--headless',
+            f'--accept=socket,host=127.0.0.1,port={self.soffice_port};urp;StarOffice.ServiceManager',
+            f'-env:UserInstallation=file://{self._soffice_profile}',
+            '--nofirststartwizard',
+            '--norestore'
+        ]
+        
+        try:
+            log.info("Starting LibreOffice listener on port %s", self.soffice_port)
+            # New session so the launcher and the soffice.bin it forks share one process group
+            self._soffice_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                                  start_new_session=True)
+        except OSError as e:
+            log.error("Error starting LibreOffice listener: %s", e)
+            self._remove_soffice_profile()
+            return False
+        
+        # Wait until the listener accepts connections
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._soffice_proc.poll() is not None:
+                log.warning("LibreOffice listener exited unexpectedly")
+                self.stop_soffice()
                 return False
+            try:
+                with socket.create_connection(('127.0.0.1', self.soffice_port), timeout=1):
+                    return True
+            except OSError:
+                time.sleep(0.5)
+        
+        log.warning("LibreOffice listener did not start in time")
+        self.stop_soffice()
+        return False
+    
+    def stop_soffice(self):
+        """Shut down the resident LibreOffice listener"""
+        if self._soffice_proc is None:
+            return
+        
+        # Signal the whole process group, terminating only the launcher can leave soffice.bin behind
+        self._signal_soffice(signal.SIGTERM)
+        if not self._wait_soffice_group(timeout=10):
+            self._signal_soffice(signal.SIGKILL)
+            self._wait_soffice_group(timeout=5)
+        self._soffice_proc.wait()
+        self._soffice_proc = None
+        self._remove_soffice_profile()
+    
+    def _signal_soffice(self, sig):
+        """Send a signal to the LibreOffice listener's process group"""
+        try:
+            os.killpg(self._soffice_proc.pid, sig)
+        except ProcessLookupError:
+            pass
+    
+    def _wait_soffice_group(self, timeout):
+        """Wait until every process in the listener's group has exited"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            # Reap the launcher so it does not keep the group alive as a zombie
+            self._soffice_proc.poll()
+            try:
+                os.killpg(self._soffice_proc.pid, 0)
+            except ProcessLookupError:
+                return True
+            time.sleep(0.2)
+        return False
+    
+    def _remove_soffice_profile(self):
+        """Delete the listener's private LibreOffice profile"""
+        if self._soffice_profile is not None:
+            shutil.rmtree(self._soffice_profile, ignore_errors=True)
+            self._soffice_profile = None
     
     def convert_ods_to_csv(self, ods_path, csv_path):
-        """Convert ODS file to CSV using LibreOffice headless mode"""
+        """Convert ODS file to CSV using the LibreOffice listener or headless mode
+        
+        The output directory and a tmp directory next to the ODS file must already exist.
+        """
         try:
-            print(f"Converting ODS to CSV: {ods_path}")
+            log.info("Converting ODS to CSV: %s", ods_path)
             
-            # Create output directory
-            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+            # Convert into a scratch directory so a partial CSV never lands in place
+            tmp_dir = os.path.join(os.path.dirname(ods_path), 'tmp')
+            tmp_csv = os.path.join(tmp_dir, os.path.splitext(os.path.basename(ods_path))[0] + '.csv')
             
-            # Use LibreOffice in headless mode for conversion
-            cmd = [
-                'libreoffice',
-                '--headless',
-                '--convert-to',
-                'csv',
-                '--outdir',
-                os.path.dirname(csv_path),
-                ods_path
-            ]
+            # Drop leftovers from an interrupted run so only this conversion's output counts
+            if os.path.exists(tmp_csv):
+                os.remove(tmp_csv)
+            
+            if self._soffice_proc is not None:
+                # Hand the conversion to the resident listener
+                cmd = [
+                    'unoconv',
+                    '--connection',
+                    f'socket,host=127.0.0.1,port={self.soffice_port};urp;StarOffice.ComponentContext',
+                    '-f',
+                    'csv',
+                    '-o',
+                    tmp_csv,
+                    ods_path
+                ]
+            else:
+                # Use LibreOffice in headless mode for conversion
+                cmd = [
+                    'libreoffice',
+                    '--headless',
+                    '--convert-to',
+                    'csv',
+                    '--outdir',
+                    tmp_dir,
+                    ods_path
+                ]
             
-            print(f"Running command: {' '.join(cmd)}")
+            log.debug("Running command: %s", ' '.join(cmd))
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
             
             if result.returncode != 0:
-                print(f"LibreOffice error: {result.stderr}")
+                log.error("LibreOffice error: %s", result.stderr)
                 return False
             
-            # LibreOffice creates the file with the same name but .csv extension
-            temp_csv = os.path.join(os.path.dirname(csv_path), 
-                                   os.path.basename(ods_path).replace('.ods', '.csv'))
+            if not os.path.exists(tmp_csv):
+                log.error("LibreOffice did not create %s", tmp_csv)
+                return False
             
-            # Rename to desired filename if different
-            if temp_csv != csv_path:
-                os.rename(temp_csv, csv_path)
+            self._move_file(tmp_csv, csv_path)
             
-            print(f"Converted to: {csv_path}")
+            log.info("Converted to: %s", csv_path)
             return True
             
         except subprocess.TimeoutExpired:
-            print("LibreOffice conversion timed out")
+            log.error("LibreOffice conversion timed out")
             return False
         except Exception as e:
-            print(f"Error converting ODS to CSV: {e}")
+            log.error("Error converting ODS to CSV: %s", e)
             return False
     
+    def convert_ods_batch(self, ods_paths, csv_dir):
+        """Convert several ODS files to CSV in an existing directory with a single LibreOffice run
+        
+        Returns the generated CSV path for each input, or None if it was not created.
+        """
+        # LibreOffice names each output after its input
+        csv_paths = [os.path.join(csv_dir, os.path.splitext(os.path.basename(ods_path))[0] + '.csv')
+                     for ods_path in ods_paths]
+        
+        # Drop leftovers from an interrupted run so only this batch's output counts
+        try:
+            for csv_path in csv_paths:
+                if os.path.exists(csv_path):
+                    os.remove(csv_path)
+        except OSError as e:
+            log.error("Error clearing old batch output: %s", e)
+            return [None] * len(ods_paths)
+        
+        try:
+            log.info("Converting %s ODS files to CSV", len(ods_paths))
+            
+            cmd = [
+                'libreoffice',
+                '--headless',
+                '--convert-to',
+                'csv',
+                '--outdir',
+                csv_dir,
+                *ods_paths
+            ]
+            
+            log.debug("Running command: %s", ' '.join(cmd))
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30 * len(ods_paths))
+            
+            if result.returncode != 0:
+                log.error("LibreOffice error: %s", result.stderr)
+        except subprocess.TimeoutExpired:
+            # The file being written when LibreOffice was killed may be partial, trust none of them
+            log.error("LibreOffice batch conversion timed out")
+            return [None] * len(ods_paths)
+        except Exception as e:
+            log.error("Error converting ODS batch to CSV: %s", e)
+        
+        # Report which outputs were created
+        return [csv_path if os.path.exists(csv_path) else None for csv_path in csv_paths]
+    
+    def finish_conversion(self, job, batch_csv=None):
+        """Convert a downloaded job to CSV and remove its ODS file on success"""
+        link_info, ods_path, csv_path, _ = job
+        
+        converted = True
+        if batch_csv:
+            # Move the finished CSV from the scratch directory into place
+            try:
+                self._move_file(batch_csv, csv_path)
+                log.info("Successfully processed %s.csv", link_info['year'])
+            except OSError as e:
+                converted = False
+                log.error("Error moving %s to %s: %s", batch_csv, csv_path, e)
+        elif self.convert_ods_to_csv(ods_path, csv_path):
+            # Converted through the listener, or retried after a failed batch
+            log.info("Successfully processed %s.csv", link_info['year'])
+        else:
+            converted = False
+            log.error("Failed to convert %s.ods", link_info['year'])
+        
+        # Clean up ODS file only if CSV was created successfully
+        if converted:
+            try:
+                os.remove(ods_path)
+                log.debug("Cleaned up temporary ODS file %s", ods_path)
+            except OSError as e:
+                log.error("Error removing %s: %s", ods_path, e)
+                return False
+        else:
+            log.warning("CSV file not created, keeping ODS file")
+        return converted
+    
+    def download_and_convert_pipelined(self, jobs):
+        """Download jobs with a thread pool while a single thread converts finished files
+        
+        Returns the jobs that were converted successfully.
+        """
+        # Downloaded jobs waiting for conversion, None tells the converter to stop
+        ready = queue.Queue()
+        converted = []
+        
+        def convert_worker():
+            while True:
+                job = ready.get()
+                if job is None:
+                    break
+                # Keep draining the queue even if one conversion blows up
+                try:
+                    if self.finish_conversion(job):
+                        converted.append(job)
+                except Exception as e:
+                    log.error("Error converting %s: %s", job[1], e)
+        
+        def download_worker(job):
+            if self.download_ods_file(job[0]['url'], job[1], job[3]):
+                ready.put(job)
+        
+        # A single converter, the listener handles one document at a time
+        converter = threading.Thread(target=convert_worker)
+        converter.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(download_worker, jobs))
+        finally:
+            ready.put(None)
+            converter.join()
+        
+        return converted
+    
     def process_dataset(self, dataset_id):
         """Process a single dataset: fetch, download ODS files, and convert to CSV"""
-        print(f"\nProcessing dataset: {dataset_id}")
+        log.info("Processing dataset: %s", dataset_id)
         
         # Get dataset via API
         api_data = self.get_dataset_via_api(dataset_id)
@@ -173,47 +562,98 @@ class TaiwanOpenDataCrawler:
         
         # Extract ODS links from API response
         ods_links = self.extract_ods_links_from_api(api_data)
-        print(f"Found {len(ods_links)} ODS files")
+        log.info("Found %s ODS files", len(ods_links))
+        
+        ods_dir = f"temp_ods/{dataset_id}"
+        csv_dir = f"raw/{dataset_id}"
+        tmp_dir = os.path.join(ods_dir, 'tmp')
+        
+        # Create the download, scratch and output directories once for the whole dataset
+        for directory in (ods_dir, tmp_dir, csv_dir):
+            os.makedirs(directory, exist_ok=True)
+        
+        # CSV files already on disk, listed once instead of a stat per link
+        with os.scandir(csv_dir) as entries:
+            existing = {entry.name for entry in entries}
         
-        # Process each ODS file
+        # ETag and length of the files each CSV was converted from, keyed by year
+        etags_path = os.path.join(csv_dir, '.etags.json')
+        etags = {}
+        if '.etags.json' in existing:
+            try:
+                etags = self._read_json(etags_path)
+            except Exception as e:
+                log.warning("Ignoring unreadable %s: %s", etags_path, e)
+        
+        # Collect one job per year
+        jobs = []
+        seen_years = set()
         for link_info in ods_links:
-            print(f"\nProcessing: {link_info['description']} ({link_info['records']} records)")
+            log.info("Processing: %s (%s records)", link_info['description'], link_info['records'])
+            
+            # Links sharing a year would share paths, keep the first one
+            if link_info['year'] in seen_years:
+                log.warning("Another link already provides %s, skipping %s", link_info['year'], link_info['url'])
+                continue
+            seen_years.add(link_info['year'])
             
             # Create paths
-            ods_dir = f"temp_ods/{dataset_id}"
-            csv_dir = f"raw/{dataset_id}"
             ods_path = os.path.join(ods_dir, f"{link_info['year']}.ods")
             csv_path = os.path.join(csv_dir, f"{link_info['year']}.csv")
-            
-            # Check if CSV already exists
-            if os.path.exists(csv_path):
-                print(f"CSV file already exists: {csv_path}, skipping download")
+            jobs.append((link_info, ods_path, csv_path, {}))
+        
+        # Check existing CSVs against the remote files, concurrently like the downloads
+        to_check = [job for job in jobs if f"{job[0]['year']}.csv" in existing]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            current = list(executor.map(
+                lambda job: self.is_csv_current(job[0]['url'], job[2], etags.get(job[0]['year'], {})),
+                to_check))
+        checked = {job[2] for job in to_check}
+        unchanged = {job[2] for job, ok in zip(to_check, current) if ok}
+        
+        # Collect the ODS files that still need to be fetched
+        pending = []
+        for job in jobs:
+            csv_path = job[2]
+            if csv_path in unchanged:
+                log.info("CSV file already exists: %s, skipping download", csv_path)
                 continue
+            if csv_path in checked:
+                log.info("Remote file changed since %s was created, downloading again", csv_path)
+            pending.append(job)
+        
+        if self._soffice_proc is not None:
+            # Per-file conversions are cheap with a resident listener, overlap them with downloads
+            converted = self.download_and_convert_pipelined(pending)
+        else:
+            # Download ODS files concurrently
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                downloaded = list(executor.map(
+                    lambda job: self.download_ods_file(job[0]['url'], job[1], job[3]), pending))
             
-            # Download ODS
-            if self.download_ods_file(link_info['url'], ods_path):
-                # Convert to CSV
-                if self.convert_ods_to_csv(ods_path, csv_path):
-                    print(f"Successfully processed {link_info['year']}.csv")
-                else:
-                    print(f"Failed to convert {link_info['year']}.ods")
-                
-                # Clean up ODS file only if CSV was created successfully
-                if os.path.exists(csv_path):
-                    os.remove(ods_path)
-                    print(f"Cleaned up temporary ODS file")
-                else:
-                    print(f"CSV file not created, keeping ODS file")
-            
-            # Be polite to the server
-            time.sleep(1)
+            # Without a resident listener, pay the LibreOffice startup cost once per dataset
+            ready = [job for job, ok in zip(pending, downloaded) if ok]
+            batch_csvs = self.convert_ods_batch([ods_path for _, ods_path, _, _ in ready],
+                                                tmp_dir) if ready else []
+            converted = [job for job, batch_csv in zip(ready, batch_csvs)
+                         if self.finish_conversion(job, batch_csv)]
+        
+        for link_info, _, _, validators in converted:
+            etags[link_info['year']] = validators
+        
+        if converted:
+            self._write_json(etags_path, etags)
     
     def run(self, dataset_ids):
         """Run the crawler for multiple datasets"""
-        for dataset_id in dataset_ids:
-            self.process_dataset(dataset_id)
+        self.start_soffice()
+        try:
+            for dataset_id in dataset_ids:
+                self.process_dataset(dataset_id)
+        finally:
+            self.stop_soffice()
         
-        print("\nCrawling completed!")
+        log.info("Crawling completed!")
 
 if __name__ == "__main__":
     # Dataset IDs to process